@@ -35,8 +35,15 @@ from fm_cp import __version__
 #                     structural validation, macOS pasteboard support.
 # ============================================================
 
+import hashlib
+import os
 import re
+import subprocess
 import sys
+# The stdlib ElementTree is backed by the C _elementtree accelerator;
+# lxml parses faster but its per-element proxies make the decompiler's
+# find/get traffic slower overall.
+import xml.etree.ElementTree as ET
 
 # ============================================================
 #  STEP DEFINITIONS
@@ -77,6 +84,8 @@ STEP_DEFS = {
 
 class ParsedStep:
     """Represents a single parsed script step."""
+    __slots__ = ('step_type', 'params', 'line_num', 'raw_text', 'enabled')
+
     def __init__(self, step_type, params=None, line_num=0, raw_text='', enabled=True):
         self.step_type = step_type
         self.params = params or {}
@@ -88,6 +97,177 @@ class ParsedStep:
         return f"<Step L{self.line_num}: {self.step_type} {self.params}>"
 
 
+# --- Step params from a payload match ---
+# Each reads its step's named subgroups and returns the params dict.
+
+def _set_error_capture_params(m):
+    return {'state': m.group('sec_state').capitalize()}
+
+
+def _allow_user_abort_params(m):
+    return {'state': m.group('aua_state').capitalize()}
+
+
+def _set_variable_params(m):
+    return {'name': m.group('sv_name'), 'value': m.group('sv_value')}
+
+
+def _set_field_by_name_params(m):
+    return {'target': m.group('sfbn_target'), 'value': m.group('sfbn_value')}
+
+
+def _set_field_params(m):
+    return {'field': m.group('sf_field'), 'value': m.group('sf_value')}
+
+
+def _if_params(m):
+    return {'calc': m.group('if_calc')}
+
+
+def _else_if_params(m):
+    return {'calc': m.group('elif_calc')}
+
+
+def _exit_loop_if_params(m):
+    return {'calc': m.group('eli_calc')}
+
+
+def _show_custom_dialog_params(m):
+    # Split on ; but respect quoted strings and parentheses
+    parts = _split_params(m.group('scd_params'))
+    params = {'title': parts[0].strip() if len(parts) > 0 else '""'}
+    params['message'] = parts[1].strip() if len(parts) > 1 else '""'
+    params['buttons'] = [p.strip() for p in parts[2:]] if len(parts) > 2 else ['"OK"']
+    return params
+
+
+def _exit_script_params(m):
+    return {'result': m.group('es_result') or ''}
+
+
+def _commit_records_params(m):
+    opts = m.group('cr_opts') or ''
+    no_dialog = 'no dialog' in opts.lower() or 'skip' in opts.lower()
+    return {'no_dialog': no_dialog}
+
+
+def _perform_script_params(m):
+    parts = _split_params(m.group('ps_params'))
+    params = {'script_name': parts[0].strip()}
+    params['parameter'] = parts[1].strip() if len(parts) > 1 else ''
+    return params
+
+
+def _go_to_layout_params(m):
+    return {'layout': m.group('gtl_layout').strip()}
+
+
+def _insert_from_url_params(m):
+    parts = _split_params(m.group('ifu_params'))
+    params = {}
+    for p in parts:
+        p = p.strip()
+        if p.lower().startswith('target:'):
+            params['target'] = p[7:].strip()
+        elif p.lower().startswith('url:'):
+            params['url'] = p[4:].strip()
+        elif p.lower().startswith('curl:') or p.lower().startswith('curloptions:'):
+            params['curl'] = p.split(':', 1)[1].strip()
+        else:
+            # First unlabeled = target, second = url
+            if 'target' not in params:
+                params['target'] = p
+            elif 'url' not in params:
+                params['url'] = p
+    return params
+
+
+def _enter_find_mode_params(m):
+    pause = m.group('efm_opts') or ''
+    return {'pause': 'pause' in pause.lower()}
+
+
+def _go_to_record_params(m):
+    return {'direction': m.group('gtr_dir').capitalize()}
+
+
+# (step type, keyword, payload pattern, params builder) in match priority order.
+# The keyword is matched against the lowercased line; the payload is matched
+# case-sensitively against the original line from where the keyword ended,
+# so captured values keep their case. Fixed words inside the payload are
+# scoped case-insensitive with (?i:...). Steps without params use None and
+# get an empty dict.
+_STEP_SYNTAX = (
+    # Set Error Capture [ On/Off ]
+    ('set_error_capture', r'set error capture', r'\s*\[\s*(?P<sec_state>(?i:On|Off))\s*\]',
+     _set_error_capture_params),
+    # Allow User Abort [ On/Off ]
+    ('allow_user_abort', r'allow user abort', r'\s*\[\s*(?P<aua_state>(?i:On|Off))\s*\]',
+     _allow_user_abort_params),
+    # Set Variable [ $name ; Value: expression ]
+    ('set_variable', r'set variable',
+     r'\s*\[\s*(?P<sv_name>\${1,2}[\w.]+)\s*;\s*(?i:Value):\s*(?P<sv_value>.+?)\s*\]',
+     _set_variable_params),
+    # Set Field By Name [ "Table::Field" ; expression ]
+    ('set_field_by_name', r'set field by name', r'\s*\[\s*(?P<sfbn_target>.+?)\s*;\s*(?P<sfbn_value>.+?)\s*\]',
+     _set_field_by_name_params),
+    # Set Field [ Table::Field ; expression ]
+    ('set_field', r'set field', r'\s*\[\s*(?P<sf_field>.+?)\s*;\s*(?P<sf_value>.+?)\s*\]',
+     _set_field_params),
+    # If [ calculation ]
+    ('if', r'if', r'\s*\[\s*(?P<if_calc>.+?)\s*\]', _if_params),
+    # Else If [ calculation ]
+    ('else_if', r'else if', r'\s*\[\s*(?P<elif_calc>.+?)\s*\]', _else_if_params),
+    # Exit Loop If [ calculation ]
+    ('exit_loop_if', r'exit loop if', r'\s*\[\s*(?P<eli_calc>.+?)\s*\]', _exit_loop_if_params),
+    # Show Custom Dialog [ "title" ; "message" ; "button1" ; "button2" ; "button3" ]
+    ('show_custom_dialog', r'show custom dialog', r'\s*\[\s*(?P<scd_params>.+?)\s*\]',
+     _show_custom_dialog_params),
+    # Exit Script [ result ] or Exit Script
+    ('exit_script', r'exit script', r'(?:\s*\[\s*(?P<es_result>.+?)\s*\])?', _exit_script_params),
+    # Commit Records [ No dialog ] or Commit Records
+    ('commit_records', r'commit records(?:/requests)?', r'\s*(?:\[\s*(?P<cr_opts>.*?)\s*\])?',
+     _commit_records_params),
+    # Perform Script [ "scriptname" ; parameter ]
+    ('perform_script', r'perform script', r'\s*\[\s*(?P<ps_params>.+?)\s*\]', _perform_script_params),
+    # Go to Layout [ "layoutname" ]
+    ('go_to_layout', r'go to layout', r'\s*\[\s*(?P<gtl_layout>.+?)\s*\]', _go_to_layout_params),
+    # Insert from URL [ options ]
+    ('insert_from_url', r'insert from url', r'\s*\[\s*(?P<ifu_params>.+?)\s*\]', _insert_from_url_params),
+    # Enter Find Mode [ Pause ]
+    ('enter_find_mode', r'enter find mode', r'\s*(?:\[\s*(?P<efm_opts>.*?)\s*\])?', _enter_find_mode_params),
+    ('perform_find', r'perform find', r'(?:\s*\[\s*\])?', None),
+    # Go to Record [ First/Last/Next/Previous ]
+    ('go_to_record', r'go to record(?:/request/page)?',
+     r'\s*\[\s*(?P<gtr_dir>(?i:First|Last|Next|Previous))\s*\]',
+     _go_to_record_params),
+    ('sort_records', r'sort records', r'\s*(?:\[\s*.*?\s*\])?', None),
+)
+
+# All keywords as one alternation; the group named after the step type is
+# the match's lastgroup. Where one keyword prefixes another (Set Field /
+# Set Field By Name) the longer is listed first, and no payload can begin
+# with a letter, so the first keyword that matches is the only step the
+# line can be.
+_STEP_KEYWORD_RE = re.compile('|'.join(f'(?P<{st}>{kw})' for st, kw, _, _ in _STEP_SYNTAX))
+# Group name → (step type, payload pattern, params builder). The step type is
+# the literal from _STEP_SYNTAX rather than m.lastgroup, so every ParsedStep
+# of a type shares one interned string and step_type comparisons hit the
+# identity fast path.
+_STEP_PAYLOADS = {st: (st, re.compile(payload), build) for st, _, payload, build in _STEP_SYNTAX}
+
+# Bare steps with no params, matched as whole lowercased lines
+_LITERAL_STEPS = {
+    'else':                 'else',
+    'end if':               'end_if',
+    'loop':                 'loop',
+    'end loop':             'end_loop',
+    'new record':           'new_record',
+    'new record/request':   'new_record',
+    'perform find':         'perform_find',
+}
+
+
 def parse_line(line, line_num):
     """Parse a single line of plain text into a ParsedStep or error string."""
     stripped = line.strip()
@@ -96,203 +276,69 @@ def parse_line(line, line_num):
     if not stripped:
         return None
 
-    # --- Disabled step: // prefix ---
-    if stripped.startswith('// '):
-        inner = stripped[3:].strip()
-        if not inner:
+    # --- Disabled step: // prefix (repeats collapse to one) ---
+    enabled = True
+    while stripped.startswith('// '):
+        stripped = stripped[3:].strip()
+        if not stripped:
             return None
-        result = parse_line(inner, line_num)
-        if isinstance(result, ParsedStep):
-            result.enabled = False
-        return result
+        enabled = False
 
     # --- Comment: # text ---
     if stripped.startswith('#'):
         text = stripped[1:].strip()
-        return ParsedStep('comment', {'text': text}, line_num, stripped)
-
-    # --- Set Error Capture [ On/Off ] ---
-    m = re.match(r'^Set Error Capture\s*\[\s*(On|Off)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        val = m.group(1).capitalize()
-        return ParsedStep('set_error_capture', {'state': val}, line_num, stripped)
-
-    # --- Allow User Abort [ On/Off ] ---
-    m = re.match(r'^Allow User Abort\s*\[\s*(On|Off)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        val = m.group(1).capitalize()
-        return ParsedStep('allow_user_abort', {'state': val}, line_num, stripped)
-
-    # --- Set Variable [ $name ; Value: expression ] ---
-    m = re.match(r'^Set Variable\s*\[\s*(\${1,2}[\w.]+)\s*;\s*Value:\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('set_variable', {
-            'name': m.group(1),
-            'value': m.group(2)
-        }, line_num, stripped)
-
-    # --- Set Field By Name [ "Table::Field" ; expression ] ---
-    m = re.match(r'^Set Field By Name\s*\[\s*(.+?)\s*;\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('set_field_by_name', {
-            'target': m.group(1),
-            'value': m.group(2)
-        }, line_num, stripped)
-
-    # --- Set Field [ Table::Field ; expression ] ---
-    m = re.match(r'^Set Field\s*\[\s*(.+?)\s*;\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('set_field', {
-            'field': m.group(1),
-            'value': m.group(2)
-        }, line_num, stripped)
-
-    # --- If [ calculation ] ---
-    m = re.match(r'^If\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('if', {'calc': m.group(1)}, line_num, stripped)
-
-    # --- Else If [ calculation ] ---
-    m = re.match(r'^Else If\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('else_if', {'calc': m.group(1)}, line_num, stripped)
-
-    # --- Else ---
-    if re.match(r'^Else$', stripped, re.IGNORECASE):
-        return ParsedStep('else', {}, line_num, stripped)
-
-    # --- End If ---
-    if re.match(r'^End If$', stripped, re.IGNORECASE):
-        return ParsedStep('end_if', {}, line_num, stripped)
-
-    # --- Loop ---
-    if re.match(r'^Loop$', stripped, re.IGNORECASE):
-        return ParsedStep('loop', {}, line_num, stripped)
-
-    # --- Exit Loop If [ calculation ] ---
-    m = re.match(r'^Exit Loop If\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('exit_loop_if', {'calc': m.group(1)}, line_num, stripped)
-
-    # --- End Loop ---
-    if re.match(r'^End Loop$', stripped, re.IGNORECASE):
-        return ParsedStep('end_loop', {}, line_num, stripped)
-
-    # --- Show Custom Dialog [ "title" ; "message" ; "button1" ; "button2" ; "button3" ] ---
-    m = re.match(r'^Show Custom Dialog\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        inner = m.group(1)
-        # Split on ; but respect quoted strings and parentheses
-        parts = _split_params(inner)
-        params = {'title': parts[0].strip() if len(parts) > 0 else '""'}
-        params['message'] = parts[1].strip() if len(parts) > 1 else '""'
-        params['buttons'] = [p.strip() for p in parts[2:]] if len(parts) > 2 else ['"OK"']
-        return ParsedStep('show_custom_dialog', params, line_num, stripped)
-
-    # --- Exit Script [ result ] ---
-    m = re.match(r'^Exit Script\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('exit_script', {'result': m.group(1)}, line_num, stripped)
-
-    # --- Exit Script (no param) ---
-    if re.match(r'^Exit Script$', stripped, re.IGNORECASE):
-        return ParsedStep('exit_script', {'result': ''}, line_num, stripped)
-
-    # --- Commit Records [ No dialog ] or Commit Records ---
-    m = re.match(r'^Commit Records(?:/Requests)?\s*(?:\[\s*(.*?)\s*\])?$', stripped, re.IGNORECASE)
-    if m:
-        opts = m.group(1) or ''
-        no_dialog = 'no dialog' in opts.lower() or 'skip' in opts.lower()
-        return ParsedStep('commit_records', {'no_dialog': no_dialog}, line_num, stripped)
-
-    # --- Perform Script [ "scriptname" ; parameter ] ---
-    m = re.match(r'^Perform Script\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        parts = _split_params(m.group(1))
-        params = {'script_name': parts[0].strip()}
-        params['parameter'] = parts[1].strip() if len(parts) > 1 else ''
-        return ParsedStep('perform_script', params, line_num, stripped)
-
-    # --- Go to Layout [ "layoutname" ] ---
-    m = re.match(r'^Go to Layout\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('go_to_layout', {'layout': m.group(1).strip()}, line_num, stripped)
-
-    # --- Insert from URL [ options ] ---
-    m = re.match(r'^Insert from URL\s*\[\s*(.+?)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        parts = _split_params(m.group(1))
-        params = {}
-        for p in parts:
-            p = p.strip()
-            if p.lower().startswith('target:'):
-                params['target'] = p[7:].strip()
-            elif p.lower().startswith('url:'):
-                params['url'] = p[4:].strip()
-            elif p.lower().startswith('curl:') or p.lower().startswith('curloptions:'):
-                params['curl'] = p.split(':', 1)[1].strip()
-            else:
-                # First unlabeled = target, second = url
-                if 'target' not in params:
-                    params['target'] = p
-                elif 'url' not in params:
-                    params['url'] = p
-        return ParsedStep('insert_from_url', params, line_num, stripped)
-
-    # --- New Record ---
-    if re.match(r'^New Record(/Request)?$', stripped, re.IGNORECASE):
-        return ParsedStep('new_record', {}, line_num, stripped)
-
-    # --- Enter Find Mode ---
-    m = re.match(r'^Enter Find Mode\s*(?:\[\s*(.*?)\s*\])?$', stripped, re.IGNORECASE)
-    if m:
-        pause = m.group(1) or ''
-        return ParsedStep('enter_find_mode', {'pause': 'pause' in pause.lower()}, line_num, stripped)
-
-    # --- Perform Find ---
-    if re.match(r'^Perform Find(?:\s*\[\s*\])?$', stripped, re.IGNORECASE):
-        return ParsedStep('perform_find', {}, line_num, stripped)
-
-    # --- Go to Record [ First/Last/Next/Previous ] ---
-    m = re.match(r'^Go to Record(?:/Request/Page)?\s*\[\s*(First|Last|Next|Previous)\s*\]$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('go_to_record', {'direction': m.group(1).capitalize()}, line_num, stripped)
-
-    # --- Sort Records ---
-    m = re.match(r'^Sort Records\s*(?:\[\s*(.*?)\s*\])?$', stripped, re.IGNORECASE)
-    if m:
-        return ParsedStep('sort_records', {}, line_num, stripped)
+        return ParsedStep('comment', {'text': text}, line_num, stripped, enabled)
+
+    # --- Bare steps: Else, End If, Loop, ... ---
+    low = stripped.lower()
+    st = _LITERAL_STEPS.get(low)
+    if st:
+        return ParsedStep(st, {}, line_num, stripped, enabled)
+
+    # --- Step syntax: keyword, then payload ---
+    k = _STEP_KEYWORD_RE.match(low)
+    if k:
+        st, payload_re, build = _STEP_PAYLOADS[k.lastgroup]
+        m = payload_re.fullmatch(stripped, k.end())
+        if m:
+            return ParsedStep(st, build(m) if build else {}, line_num, stripped, enabled)
 
     # --- Unrecognized ---
     return f"Line {line_num}: Unrecognized step: {stripped}"
 
 
+# Characters that can change _split_params state; everything else is copied through
+_RE_SPLIT_TOKEN = re.compile(r'[\\"()\[\];]')
+
+# Escaped characters and quoted runs (an unterminated quote runs to the end)
+_RE_QUOTED_OR_ESCAPED = re.compile(r'\\.|"(?:\\.|[^"\\])*"?', re.DOTALL)
+
+
 def _split_params(s):
     """Split parameters on semicolons, respecting quotes and nested parens/brackets."""
+    if ';' not in s:
+        return [s] if s else []
+
     parts = []
-    current = []
+    start = 0
     depth_paren = 0
     depth_bracket = 0
     in_quote = False
-    escape = False
+    escaped = -1    # index of the character following a backslash
 
-    for ch in s:
-        if escape:
-            current.append(ch)
-            escape = False
+    for m in _RE_SPLIT_TOKEN.finditer(s):
+        i = m.start()
+        if i == escaped:
             continue
+        ch = s[i]
         if ch == '\\':
-            escape = True
-            current.append(ch)
-            continue
-        if ch == '"' and depth_paren == 0:
-            in_quote = not in_quote
-            current.append(ch)
-            continue
-        if in_quote:
-            current.append(ch)
+            escaped = i + 1
+        elif ch == '"':
+            if depth_paren == 0:
+                in_quote = not in_quote
+        elif in_quote:
             continue
-        if ch == '(':
+        elif ch == '(':
             depth_paren += 1
         elif ch == ')':
             depth_paren -= 1
@@ -300,56 +346,40 @@ def _split_params(s):
             depth_bracket += 1
         elif ch == ']':
             depth_bracket -= 1
-        elif ch == ';' and depth_paren == 0 and depth_bracket == 0:
-            parts.append(''.join(current))
-            current = []
-            continue
-        current.append(ch)
+        elif depth_paren == 0 and depth_bracket == 0:
+            parts.append(s[start:i])
+            start = i + 1
 
-    if current:
-        parts.append(''.join(current))
+    if start < len(s):
+        parts.append(s[start:])
     return parts
 
 
 def _count_delimiters(text):
     """Count unbalanced (), [] in text, respecting quotes.
     Returns (paren_depth, bracket_depth)."""
-    paren = 0
-    bracket = 0
-    in_quote = False
-    escape = False
-    for ch in text:
-        if escape:
-            escape = False
-            continue
-        if ch == '\\':
-            escape = True
-            continue
-        if ch == '"':
-            in_quote = not in_quote
-            continue
-        if in_quote:
-            continue
-        if ch == '(':
-            paren += 1
-        elif ch == ')':
-            paren -= 1
-        elif ch == '[':
-            bracket += 1
-        elif ch == ']':
-            bracket -= 1
-    return paren, bracket
+    if '"' in text or '\\' in text:
+        text = _RE_QUOTED_OR_ESCAPED.sub('', text)
+    return (text.count('(') - text.count(')'),
+            text.count('[') - text.count(']'))
+
+
+# Real line breaks only: LF, CRLF or a lone CR. str.splitlines() would also
+# break on \x0b, \x0c, \x1c-\x1e, \x85, \u2028 and \u2029, splitting quoted
+# literals pasted from rich-text sources.
+_RE_NEWLINE = re.compile(r'\r\n?|\n')
 
 
 def parse_text(text):
     """Parse multi-line plain text into a list of ParsedSteps.
+    Accepts a string or an iterable of lines, such as an open file.
     Accumulates continuation lines when delimiters are unbalanced.
     Returns (steps, errors) tuple."""
     steps = []
     errors = []
-    lines = text.split('\n')
+    lines = _RE_NEWLINE.split(text) if isinstance(text, str) else text
 
-    accumulator = []    # lines being accumulated
+    accumulator = []    # stripped non-blank lines being accumulated
     start_line = 0      # line number where accumulation started
     paren_depth = 0
     bracket_depth = 0
@@ -359,9 +389,8 @@ def parse_text(text):
         nonlocal accumulator, start_line, paren_depth, bracket_depth
         if not accumulator:
             return
-        # Join with newline, but parse_line regexes expect single line
-        # Collapse to single line: join with space, normalize whitespace
-        logical = ' '.join(l.strip() for l in accumulator if l.strip())
+        # parse_line expects a single line: join the stripped lines with spaces
+        logical = ' '.join(accumulator)
         result = parse_line(logical, start_line)
         if result is None:
             pass  # blank
@@ -376,31 +405,25 @@ def parse_text(text):
     for i, line in enumerate(lines, 1):
         stripped = line.strip()
 
-        # If we're NOT accumulating, handle normally
-        if not accumulator:
-            if not stripped:
-                continue  # blank line
+        if not stripped:
+            continue  # blank line (dropped from continuations too)
 
-            # Start a new logical line
+        # If we're NOT accumulating, this line starts a new logical line;
+        # otherwise it is a continuation
+        if not accumulator:
             start_line = i
-            accumulator.append(line)
-            p, b = _count_delimiters(stripped)
-            paren_depth += p
-            bracket_depth += b
+        accumulator.append(stripped)
 
-            # If balanced, flush immediately
-            if paren_depth <= 0 and bracket_depth <= 0:
-                _flush()
-        else:
-            # We're accumulating — append continuation
-            accumulator.append(line)
+        # A line with no delimiters leaves the depth unchanged, so only
+        # lines containing one need the quote-aware count
+        if '[' in stripped or ']' in stripped or '(' in stripped or ')' in stripped:
             p, b = _count_delimiters(stripped)
             paren_depth += p
             bracket_depth += b
 
-            # Check if balanced now
-            if paren_depth <= 0 and bracket_depth <= 0:
-                _flush()
+        # Flush once balanced
+        if paren_depth <= 0 and bracket_depth <= 0:
+            _flush()
 
     # Flush anything remaining (unbalanced at EOF)
     if accumulator:
@@ -414,17 +437,22 @@ def parse_text(text):
 
 def _merge_comments(steps):
     """Merge consecutive comment steps (same enabled state) into one."""
-    if not steps:
-        return steps
-    merged = [steps[0]]
-    for step in steps[1:]:
-        prev = merged[-1]
-        if (step.step_type == 'comment' and prev.step_type == 'comment'
+    merged = []
+    runs = []   # (first comment step, texts) for each comment run
+    for step in steps:
+        prev = merged[-1] if merged else None
+        if (prev is not None and step.step_type == 'comment' and prev.step_type == 'comment'
                 and step.enabled == prev.enabled):
-            # Merge text with newline
-            prev.params['text'] = prev.params.get('text', '') + '\n' + step.params.get('text', '')
+            texts.append(step.params.get('text', ''))
         else:
             merged.append(step)
+            if step.step_type == 'comment':
+                texts = [step.params.get('text', '')]
+                runs.append((step, texts))
+    # Join each run's text with newlines once, rather than per merged line
+    for first, texts in runs:
+        if len(texts) > 1:
+            first.params['text'] = '\n'.join(texts)
     return merged
 
 
@@ -474,11 +502,22 @@ class ValidationResult:
         return '\n'.join(lines)
 
 
+class _Block:
+    """An open If or Loop block on the validator's stack."""
+    __slots__ = ('block_type', 'line_num', 'has_else')
+
+    def __init__(self, block_type, line_num):
+        self.block_type = block_type
+        self.line_num = line_num
+        self.has_else = False
+
+
 def validate_structure(steps):
     """Validate structural integrity of parsed steps.
     Returns a ValidationResult."""
     result = ValidationResult()
-    block_stack = []  # (type, line_num) — tracks open blocks
+    block_stack = []  # _Block frames — tracks open blocks
+    loop_depth = 0    # open Loop blocks on the stack
 
     for step in steps:
         st = step.step_type
@@ -486,57 +525,60 @@ def validate_structure(steps):
 
         # --- If opens a block ---
         if st == 'if':
-            block_stack.append(('if', ln, False))  # (type, line, has_else)
+            block_stack.append(_Block('if', ln))
 
         # --- Else If must be inside an If block ---
         elif st == 'else_if':
-            if not block_stack or block_stack[-1][0] != 'if':
+            if not block_stack or block_stack[-1].block_type != 'if':
                 result.add_error(ln, "Else If without matching If")
-            elif block_stack[-1][2]:  # already has Else
+            elif block_stack[-1].has_else:
                 result.add_error(ln, "Else If after Else (must come before Else)")
 
         # --- Else must be inside an If block ---
         elif st == 'else':
-            if not block_stack or block_stack[-1][0] != 'if':
+            if not block_stack or block_stack[-1].block_type != 'if':
                 result.add_error(ln, "Else without matching If")
-            elif block_stack[-1][2]:
+            elif block_stack[-1].has_else:
                 result.add_error(ln, "Duplicate Else — only one Else per If block")
             else:
                 # Mark this If block as having an Else
-                block_stack[-1] = ('if', block_stack[-1][1], True)
+                block_stack[-1].has_else = True
 
         # --- End If closes an If block ---
         elif st == 'end_if':
             if not block_stack:
                 result.add_error(ln, "Orphan End If — no matching If")
-            elif block_stack[-1][0] != 'if':
-                result.add_error(ln, f"End If found but current open block is {block_stack[-1][0].title()} (opened line {block_stack[-1][1]})")
+            elif block_stack[-1].block_type != 'if':
+                top = block_stack[-1]
+                result.add_error(ln, f"End If found but current open block is {top.block_type.title()} (opened line {top.line_num})")
             else:
                 block_stack.pop()
 
         # --- Loop opens a block ---
         elif st == 'loop':
-            block_stack.append(('loop', ln, False))
+            block_stack.append(_Block('loop', ln))
+            loop_depth += 1
 
         # --- Exit Loop If must be inside a Loop ---
         elif st == 'exit_loop_if':
-            # Check if any ancestor is a loop
-            in_loop = any(b[0] == 'loop' for b in block_stack)
-            if not in_loop:
+            if not loop_depth:
                 result.add_error(ln, "Exit Loop If outside of any Loop")
 
         # --- End Loop closes a Loop block ---
         elif st == 'end_loop':
             if not block_stack:
                 result.add_error(ln, "Orphan End Loop — no matching Loop")
-            elif block_stack[-1][0] != 'loop':
-                result.add_error(ln, f"End Loop found but current open block is {block_stack[-1][0].title()} (opened line {block_stack[-1][1]})")
+            elif block_stack[-1].block_type != 'loop':
+                top = block_stack[-1]
+                result.add_error(ln, f"End Loop found but current open block is {top.block_type.title()} (opened line {top.line_num})")
             else:
                 block_stack.pop()
+                loop_depth -= 1
 
     # --- Check for unclosed blocks ---
-    for block_type, open_line, _ in block_stack:
-        result.add_error(open_line, f"Unclosed {block_type.title()} — missing End {block_type.title()}")
+    for block in block_stack:
+        block_type = block.block_type.title()
+        result.add_error(block.line_num, f"Unclosed {block_type} — missing End {block_type}")
 
     # --- Advisory: step count ---
     if len(steps) == 0:
@@ -549,189 +591,246 @@ def validate_structure(steps):
 #  STAGE 3: XML GENERATOR
 # ============================================================
 
-def _cdata(value):
-    """Wrap value in CDATA."""
-    return f"<![CDATA[{value}]]>"
-
-
 def _strip_outer_quotes(s):
-    """Remove surrounding quotes if present."""
-    s = s.strip()
+    """Remove surrounding quotes if present. Callers pass already-stripped values."""
     if len(s) >= 2 and s[0] == '"' and s[-1] == '"':
         return s[1:-1]
     return s
 
 
+# Escapes for text written outside CDATA, applied in one str.translate pass
+_XML_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '\n': '&#10;', '"': '&quot;',
+})
+
+
+# --- Step XML templates ---
+# %-format strings, one per step shape; the first slot is always the enable
+# attribute value. Calculations are wrapped in CDATA inline.
+
+_TPL_COMMENT = '<Step enable="%s" id="89" name="# (comment)"><Text>%s</Text></Step>'
+_TPL_SET_ERROR_CAPTURE = '<Step enable="%s" id="86" name="Set Error Capture"><Set state="%s"></Set></Step>'
+_TPL_ALLOW_USER_ABORT = '<Step enable="%s" id="85" name="Allow User Abort"><Set state="%s"></Set></Step>'
+_TPL_SET_VARIABLE = ('<Step enable="%s" id="141" name="Set Variable">'
+                     '<Value><Calculation><![CDATA[%s]]></Calculation></Value>'
+                     '<Repetition><Calculation><![CDATA[1]]></Calculation></Repetition>'
+                     '<Name>%s</Name></Step>')
+_TPL_SET_FIELD_BY_NAME = ('<Step enable="%s" id="147" name="Set Field By Name">'
+                          '<Result><Calculation><![CDATA[%s]]></Calculation></Result>'
+                          '<TargetName><Calculation><![CDATA[%s]]></Calculation></TargetName></Step>')
+_TPL_IF = '<Step enable="%s" id="68" name="If"><Calculation><![CDATA[%s]]></Calculation></Step>'
+_TPL_ELSE_IF = '<Step enable="%s" id="125" name="Else If"><Calculation><![CDATA[%s]]></Calculation></Step>'
+_TPL_ELSE = '<Step enable="%s" id="69" name="Else"></Step>'
+_TPL_END_IF = '<Step enable="%s" id="70" name="End If"></Step>'
+_TPL_LOOP = '<Step enable="%s" id="71" name="Loop"><FlushType value="Always"></FlushType></Step>'
+_TPL_EXIT_LOOP_IF = '<Step enable="%s" id="72" name="Exit Loop If"><Calculation><![CDATA[%s]]></Calculation></Step>'
+_TPL_END_LOOP = '<Step enable="%s" id="73" name="End Loop"></Step>'
+_TPL_SHOW_CUSTOM_DIALOG = ('<Step enable="%s" id="87" name="Show Custom Dialog">'
+                           '<Title><Calculation><![CDATA[%s]]></Calculation></Title>'
+                           '<Message><Calculation><![CDATA[%s]]></Calculation></Message>'
+                           '<Buttons>%s</Buttons></Step>')
+_TPL_BUTTON = '<Button><Calculation><![CDATA[%s]]></Calculation></Button>'
+_TPL_EXIT_SCRIPT = '<Step enable="%s" id="103" name="Exit Script"><Calculation><![CDATA[%s]]></Calculation></Step>'
+_TPL_EXIT_SCRIPT_BARE = '<Step enable="%s" id="103" name="Exit Script"></Step>'
+_TPL_COMMIT_RECORDS = '<Step enable="%s" id="75" name="Commit Records/Requests">%s</Step>'
+_TPL_PERFORM_SCRIPT = ('<Step enable="%s" id="1" name="Perform Script">'
+                       '<Calculation><![CDATA[%s]]></Calculation><Text>%s</Text></Step>')
+_TPL_PERFORM_SCRIPT_BARE = '<Step enable="%s" id="1" name="Perform Script"><Text>%s</Text></Step>'
+_TPL_GO_TO_LAYOUT = ('<Step enable="%s" id="6" name="Go to Layout">'
+                     '<LayoutDestination value="ByName"></LayoutDestination>'
+                     '<Layout id="0" name="%s"></Layout></Step>')
+_TPL_GO_TO_CURRENT_LAYOUT = ('<Step enable="%s" id="6" name="Go to Layout">'
+                             '<LayoutDestination value="CurrentLayout"></LayoutDestination>'
+                             '<Layout id="0" name=""></Layout></Step>')
+_TPL_INSERT_FROM_URL = ('<Step enable="%s" id="160" name="Insert from URL">'
+                        '<NoInteract state="False"></NoInteract>'
+                        '<DontEncodeURL state="False"></DontEncodeURL>'
+                        '<SelectAll state="False"></SelectAll>'
+                        '<VerifySSLCertificates state="False"></VerifySSLCertificates>'
+                        '%s%s</Step>')
+_TPL_URL = '<URL><Calculation><![CDATA[%s]]></Calculation></URL>'
+_TPL_CURL_OPTIONS = '<CURLOptions><Calculation><![CDATA[%s]]></Calculation></CURLOptions>'
+_TPL_GO_TO_RECORD = ('<Step enable="%s" id="16" name="Go to Record/Request/Page">'
+                     '<RowPageLocation value="%s"></RowPageLocation>'
+                     '<NoInteract state="False"></NoInteract></Step>')
+_TPL_NEW_RECORD = '<Step enable="%s" id="7" name="New Record/Request"></Step>'
+_TPL_ENTER_FIND_MODE = ('<Step enable="%s" id="22" name="Enter Find Mode">'
+                        '<Pause state="%s"></Pause>'
+                        '<Restore state="False"></Restore></Step>')
+_TPL_PERFORM_FIND = '<Step enable="%s" id="28" name="Perform Find"><Restore state="False"></Restore></Step>'
+_TPL_SORT_RECORDS = ('<Step enable="%s" id="39" name="Sort Records">'
+                     '<NoInteract state="False"></NoInteract><Restore state="False"></Restore></Step>')
+
+
+# --- Per-step XML emitters ---
+# Each takes the step params and the enable attribute value ('True'/'False')
+# and returns the complete <Step> element.
+
+def _emit_comment(p, enable):
+    # Encode special chars for XML
+    return _TPL_COMMENT % (enable, p.get('text', '').translate(_XML_ESCAPE_TABLE))
+
+
+def _emit_set_error_capture(p, enable):
+    return _TPL_SET_ERROR_CAPTURE % (enable, 'True' if p.get('state') == 'On' else 'False')
+
+
+def _emit_allow_user_abort(p, enable):
+    return _TPL_ALLOW_USER_ABORT % (enable, 'True' if p.get('state') == 'On' else 'False')
+
+
+def _emit_set_variable(p, enable):
+    return _TPL_SET_VARIABLE % (enable, p.get('value', ''), p.get('name', ''))
+
+
+def _emit_set_field_by_name(p, enable):
+    return _TPL_SET_FIELD_BY_NAME % (enable, p.get('value', ''), p.get('target', ''))
+
+
+def _emit_if(p, enable):
+    return _TPL_IF % (enable, p.get('calc', ''))
+
+
+def _emit_else_if(p, enable):
+    return _TPL_ELSE_IF % (enable, p.get('calc', ''))
+
+
+def _emit_else(p, enable):
+    return _TPL_ELSE % enable
+
+
+def _emit_end_if(p, enable):
+    return _TPL_END_IF % enable
+
+
+def _emit_loop(p, enable):
+    return _TPL_LOOP % enable
+
+
+def _emit_exit_loop_if(p, enable):
+    return _TPL_EXIT_LOOP_IF % (enable, p.get('calc', ''))
+
+
+def _emit_end_loop(p, enable):
+    return _TPL_END_LOOP % enable
+
+
+def _emit_show_custom_dialog(p, enable):
+    buttons = p.get('buttons', ['"OK"'])
+    # Always 3 buttons (FM requires all 3 elements)
+    buttons_xml = ''.join(_TPL_BUTTON % btn if btn else '<Button></Button>'
+                          for btn in (list(buttons) + ['', '', ''])[:3])
+    return _TPL_SHOW_CUSTOM_DIALOG % (enable, p.get('title', '""'), p.get('message', '""'), buttons_xml)
+
+
+def _emit_exit_script(p, enable):
+    result_val = p.get('result', '')
+    if result_val:
+        return _TPL_EXIT_SCRIPT % (enable, result_val)
+    return _TPL_EXIT_SCRIPT_BARE % enable
+
+
+def _emit_commit_records(p, enable):
+    nd = '<NoInteract state="True"></NoInteract>' if p.get('no_dialog', False) else ''
+    return _TPL_COMMIT_RECORDS % (enable, nd)
+
+
+def _emit_perform_script(p, enable):
+    name = _strip_outer_quotes(p.get('script_name', ''))
+    param = p.get('parameter', '')
+    if param:
+        return _TPL_PERFORM_SCRIPT % (enable, param, name)
+    return _TPL_PERFORM_SCRIPT_BARE % (enable, name)
+
+
+def _emit_go_to_layout(p, enable):
+    layout = _strip_outer_quotes(p.get('layout', ''))
+    if layout:
+        return _TPL_GO_TO_LAYOUT % (enable, layout)
+    return _TPL_GO_TO_CURRENT_LAYOUT % enable
+
+
+def _emit_insert_from_url(p, enable):
+    url = p.get('url', '')
+    curl = p.get('curl', '')
+    return _TPL_INSERT_FROM_URL % (enable,
+                                   _TPL_URL % url if url else '',
+                                   _TPL_CURL_OPTIONS % curl if curl else '')
+
+
+def _emit_go_to_record(p, enable):
+    return _TPL_GO_TO_RECORD % (enable, p.get('direction', 'First'))
+
+
+def _emit_new_record(p, enable):
+    return _TPL_NEW_RECORD % enable
+
+
+def _emit_enter_find_mode(p, enable):
+    return _TPL_ENTER_FIND_MODE % (enable, 'True' if p.get('pause', False) else 'False')
+
+
+def _emit_perform_find(p, enable):
+    return _TPL_PERFORM_FIND % enable
+
+
+def _emit_sort_records(p, enable):
+    return _TPL_SORT_RECORDS % enable
+
+
+# Step type → emitter, built once at import
+_XML_EMITTERS = {
+    'comment':              _emit_comment,
+    'set_error_capture':    _emit_set_error_capture,
+    'allow_user_abort':     _emit_allow_user_abort,
+    'set_variable':         _emit_set_variable,
+    'set_field_by_name':    _emit_set_field_by_name,
+    'if':                   _emit_if,
+    'else_if':              _emit_else_if,
+    'else':                 _emit_else,
+    'end_if':               _emit_end_if,
+    'loop':                 _emit_loop,
+    'exit_loop_if':         _emit_exit_loop_if,
+    'end_loop':             _emit_end_loop,
+    'show_custom_dialog':   _emit_show_custom_dialog,
+    'exit_script':          _emit_exit_script,
+    'commit_records':       _emit_commit_records,
+    'perform_script':       _emit_perform_script,
+    'go_to_layout':         _emit_go_to_layout,
+    'insert_from_url':      _emit_insert_from_url,
+    'go_to_record':         _emit_go_to_record,
+    'new_record':           _emit_new_record,
+    'enter_find_mode':      _emit_enter_find_mode,
+    'perform_find':         _emit_perform_find,
+    'sort_records':         _emit_sort_records,
+}
+
+
+_TPL_UNKNOWN = '<!-- Unknown step: %s -->'
+
+
 def step_to_xml(step):
     """Convert a ParsedStep to FM XML string."""
-    st = step.step_type
-    p = step.params
-    sid = STEP_DEFS.get(st, {}).get('id', 0)
-    sname = STEP_DEFS.get(st, {}).get('name', '')
-
-    if st == 'comment':
-        text = p.get('text', '')
-        # Encode special chars for XML
-        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-        text = text.replace('\n', '&#10;').replace('"', '&quot;')
-        return f'<Step enable="True" id="89" name="# (comment)"><Text>{text}</Text></Step>'
-
-    elif st == 'set_error_capture':
-        val = 'True' if p.get('state') == 'On' else 'False'
-        return f'<Step enable="True" id="86" name="Set Error Capture"><Set state="{val}"></Set></Step>'
-
-    elif st == 'allow_user_abort':
-        val = 'True' if p.get('state') == 'On' else 'False'
-        return f'<Step enable="True" id="85" name="Allow User Abort"><Set state="{val}"></Set></Step>'
-
-    elif st == 'set_variable':
-        name = p.get('name', '')
-        value = p.get('value', '')
-        return (f'<Step enable="True" id="141" name="Set Variable">'
-                f'<Value><Calculation>{_cdata(value)}</Calculation></Value>'
-                f'<Repetition><Calculation>{_cdata("1")}</Calculation></Repetition>'
-                f'<Name>{name}</Name></Step>')
-
-    elif st == 'set_field_by_name':
-        target = p.get('target', '')
-        value = p.get('value', '')
-        return (f'<Step enable="True" id="147" name="Set Field By Name">'
-                f'<Result><Calculation>{_cdata(value)}</Calculation></Result>'
-                f'<TargetName><Calculation>{_cdata(target)}</Calculation></TargetName></Step>')
-
-    elif st == 'if':
-        calc = p.get('calc', '')
-        return (f'<Step enable="True" id="68" name="If">'
-                f'<Calculation>{_cdata(calc)}</Calculation></Step>')
-
-    elif st == 'else_if':
-        calc = p.get('calc', '')
-        return (f'<Step enable="True" id="125" name="Else If">'
-                f'<Calculation>{_cdata(calc)}</Calculation></Step>')
-
-    elif st == 'else':
-        return '<Step enable="True" id="69" name="Else"></Step>'
-
-    elif st == 'end_if':
-        return '<Step enable="True" id="70" name="End If"></Step>'
-
-    elif st == 'loop':
-        return '<Step enable="True" id="71" name="Loop"><FlushType value="Always"></FlushType></Step>'
-
-    elif st == 'exit_loop_if':
-        calc = p.get('calc', '')
-        return (f'<Step enable="True" id="72" name="Exit Loop If">'
-                f'<Calculation>{_cdata(calc)}</Calculation></Step>')
-
-    elif st == 'end_loop':
-        return '<Step enable="True" id="73" name="End Loop"></Step>'
-
-    elif st == 'show_custom_dialog':
-        title = p.get('title', '""')
-        message = p.get('message', '""')
-        buttons = p.get('buttons', ['"OK"'])
-
-        xml = (f'<Step enable="True" id="87" name="Show Custom Dialog">'
-               f'<Title><Calculation>{_cdata(title)}</Calculation></Title>'
-               f'<Message><Calculation>{_cdata(message)}</Calculation></Message>'
-               f'<Buttons>')
-
-        # Ensure 3 buttons (FM requires all 3 elements)
-        while len(buttons) < 3:
-            buttons.append('')
-        for btn in buttons[:3]:
-            if btn:
-                xml += f'<Button><Calculation>{_cdata(btn)}</Calculation></Button>'
-            else:
-                xml += '<Button></Button>'
-        xml += '</Buttons></Step>'
-        return xml
-
-    elif st == 'exit_script':
-        result_val = p.get('result', '')
-        if result_val:
-            return (f'<Step enable="True" id="103" name="Exit Script">'
-                    f'<Calculation>{_cdata(result_val)}</Calculation></Step>')
-        else:
-            return '<Step enable="True" id="103" name="Exit Script"></Step>'
-
-    elif st == 'commit_records':
-        no_dialog = p.get('no_dialog', False)
-        nd = '<NoInteract state="True"></NoInteract>' if no_dialog else ''
-        return f'<Step enable="True" id="75" name="Commit Records/Requests">{nd}</Step>'
-
-    elif st == 'perform_script':
-        name = _strip_outer_quotes(p.get('script_name', ''))
-        param = p.get('parameter', '')
-        xml = f'<Step enable="True" id="1" name="Perform Script">'
-        if param:
-            xml += f'<Calculation>{_cdata(param)}</Calculation>'
-        xml += f'<Text>{name}</Text>'
-        xml += '</Step>'
-        return xml
-
-    elif st == 'go_to_layout':
-        layout = _strip_outer_quotes(p.get('layout', ''))
-        if layout:
-            return (f'<Step enable="True" id="6" name="Go to Layout">'
-                    f'<LayoutDestination value="ByName"></LayoutDestination>'
-                    f'<Layout id="0" name="{layout}"></Layout></Step>')
-        else:
-            return (f'<Step enable="True" id="6" name="Go to Layout">'
-                    f'<LayoutDestination value="CurrentLayout"></LayoutDestination>'
-                    f'<Layout id="0" name=""></Layout></Step>')
-
-    elif st == 'insert_from_url':
-        target = p.get('target', '')
-        url = p.get('url', '')
-        curl = p.get('curl', '')
-        xml = f'<Step enable="True" id="160" name="Insert from URL">'
-        xml += '<NoInteract state="False"></NoInteract>'
-        xml += '<DontEncodeURL state="False"></DontEncodeURL>'
-        xml += '<SelectAll state="False"></SelectAll>'
-        xml += '<VerifySSLCertificates state="False"></VerifySSLCertificates>'
-        if url:
-            xml += f'<URL><Calculation>{_cdata(url)}</Calculation></URL>'
-        if curl:
-            xml += f'<CURLOptions><Calculation>{_cdata(curl)}</Calculation></CURLOptions>'
-        xml += '</Step>'
-        return xml
-
-    elif st == 'go_to_record':
-        direction = p.get('direction', 'First')
-        return (f'<Step enable="True" id="16" name="Go to Record/Request/Page">'
-                f'<RowPageLocation value="{direction}"></RowPageLocation>'
-                f'<NoInteract state="False"></NoInteract></Step>')
-
-    elif st == 'new_record':
-        return '<Step enable="True" id="7" name="New Record/Request"></Step>'
-
-    elif st == 'enter_find_mode':
-        pause = p.get('pause', False)
-        pause_state = 'True' if pause else 'False'
-        return (f'<Step enable="True" id="22" name="Enter Find Mode">'
-                f'<Pause state="{pause_state}"></Pause>'
-                f'<Restore state="False"></Restore></Step>')
-
-    elif st == 'perform_find':
-        return '<Step enable="True" id="28" name="Perform Find"><Restore state="False"></Restore></Step>'
-
-    elif st == 'sort_records':
-        return '<Step enable="True" id="39" name="Sort Records"><NoInteract state="False"></NoInteract><Restore state="False"></Restore></Step>'
-
-    else:
-        return f'<!-- Unknown step: {st} -->'
+    emit = _XML_EMITTERS.get(step.step_type)
+    if emit is None:
+        return _TPL_UNKNOWN % step.step_type
+    return emit(step.params, 'True' if step.enabled else 'False')
 
 
 def generate_xml(steps):
     """Generate complete fmxmlsnippet from validated steps."""
+    # Same dispatch as step_to_xml, inlined so each step costs one emitter
+    # call and one append onto the shared parts list
     xml_parts = ['<fmxmlsnippet type="FMObjectList">']
+    append = xml_parts.append
+    get_emitter = _XML_EMITTERS.get
     for step in steps:
-        xml = step_to_xml(step)
-        if not step.enabled:
-            xml = xml.replace('enable="True"', 'enable="False"', 1)
-        xml_parts.append(xml)
-    xml_parts.append('</fmxmlsnippet>')
+        emit = get_emitter(step.step_type)
+        if emit is None:
+            append(_TPL_UNKNOWN % step.step_type)
+        else:
+            append(emit(step.params, 'True' if step.enabled else 'False'))
+    append('</fmxmlsnippet>')
     return ''.join(xml_parts)
 
 
@@ -739,375 +838,510 @@ def generate_xml(steps):
 #  STAGE 4: DECOMPILER (XML → Plain Text)
 # ============================================================
 
+_FEED_CHUNK = 1 << 16
+
+
+def _iter_steps(chunks):
+    """Yield each <Step> element as soon as the parser closes it.
+
+    The step is cleared once the caller has rendered it, so the tree never
+    holds more than one step's children at a time."""
+    parser = ET.XMLPullParser(('end',))
+    read_events = parser.read_events
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, elem in read_events():
+            if elem.tag == 'Step':
+                yield elem
+                elem.clear()
+    parser.close()
+
+
+def _chunked(text):
+    """Slice in-memory XML into parser-sized chunks."""
+    for i in range(0, len(text), _FEED_CHUNK):
+        yield text[i:i + _FEED_CHUNK]
+
+
 def decompile_xml(xml_text):
-    """Convert FM XML snippet back to readable plain text."""
-    import xml.etree.ElementTree as ET
+    """Convert FM XML snippet (str or encoded bytes) back to readable plain text."""
+    try:
+        return _decompile_steps(_iter_steps(_chunked(xml_text)))
+    except ET.ParseError as e:
+        return f"XML Parse Error: {e}"
+
+
+def _read_chunks(f):
+    """Read an open file in parser-sized chunks."""
+    read = f.read
+    chunk = read(_FEED_CHUNK)
+    while chunk:
+        yield chunk
+        chunk = read(_FEED_CHUNK)
+
 
-    # Parse the XML
+def decompile_stream(source):
+    """Convert FM XML from a file path or open file to plain text, parsing
+    it incrementally instead of loading the whole document first."""
     try:
-        root = ET.fromstring(xml_text)
+        if hasattr(source, 'read'):
+            return _decompile_steps(_iter_steps(_read_chunks(source)))
+        with open(source, 'rb') as f:
+            return _decompile_steps(_iter_steps(_read_chunks(f)))
     except ET.ParseError as e:
         return f"XML Parse Error: {e}"
 
-    lines = []
-    indent_level = 0
-    indent_str = "    "
 
-    for step_elem in root.iter('Step'):
-        step_id = step_elem.get('id', '')
-        step_name = step_elem.get('name', '')
-        enable = step_elem.get('enable', 'True')
+# --- Step text renderers ---
+# Each takes the <Step> element, its tag -> first-child map and the line
+# lead (indent + disabled prefix), and returns the rendered line(s).
 
-        prefix = "" if enable == "True" else "// "
+# Stand-in for an absent child (no text, no children), so lookups read as
+# (cm.get(tag, _NO_CHILD).text or '').strip() without a None check.
+# Never mutated.
+_NO_CHILD = ET.Element('')
 
-        # Decrease indent before End and Else
-        if step_id in ('70', '73'):  # End If, End Loop
-            indent_level = max(0, indent_level - 1)
-        elif step_id in ('69', '125'):  # Else, Else If
-            indent_level = max(0, indent_level - 1)
 
-        pad = indent_str * indent_level
-
-        # --- Comment ---
-        if step_id == '89':
-            text = _get_text(step_elem, 'Text') or ''
-            # Multi-line comments: prefix each line with #
-            comment_lines = text.split('\n')
-            for cl in comment_lines:
-                lines.append(f"{pad}{prefix}# {cl}")
-
-        # --- Set Error Capture ---
-        elif step_id == '86':
-            set_elem = step_elem.find('Set')
-            state = 'On' if set_elem is not None and set_elem.get('state') == 'True' else 'Off'
-            lines.append(f"{pad}{prefix}Set Error Capture [ {state} ]")
-
-        # --- Allow User Abort ---
-        elif step_id == '85':
-            set_elem = step_elem.find('Set')
-            state = 'On' if set_elem is not None and set_elem.get('state') == 'True' else 'Off'
-            lines.append(f"{pad}{prefix}Allow User Abort [ {state} ]")
-
-        # --- Set Variable ---
-        elif step_id == '141':
-            name = _get_text(step_elem, 'Name') or '$?'
-            value = _get_calc(step_elem, 'Value') or ''
-            lines.append(f"{pad}{prefix}Set Variable [ {name} ; Value: {value} ]")
-
-        # --- Set Field By Name ---
-        elif step_id == '147':
-            target = _get_calc(step_elem, 'TargetName') or '?'
-            value = _get_calc(step_elem, 'Result') or ''
-            lines.append(f"{pad}{prefix}Set Field By Name [ {target} ; {value} ]")
-
-        # --- If ---
-        elif step_id == '68':
-            calc = _get_calc_direct(step_elem) or '?'
-            lines.append(f"{pad}{prefix}If [ {calc} ]")
-            indent_level += 1
+def _text_comment(step_elem, cm, lead):
+    text = (cm.get('Text', _NO_CHILD).text or '').strip()
+    # Multi-line comments: prefix each line with #
+    return '\n'.join([f"{lead}# {cl}" for cl in text.split('\n')])
 
-        # --- Else If ---
-        elif step_id == '125' and step_name == 'Else If':
-            calc = _get_calc_direct(step_elem) or '?'
-            lines.append(f"{pad}{prefix}Else If [ {calc} ]")
-            indent_level += 1
 
-        # --- Else ---
-        elif step_id == '69':
-            lines.append(f"{pad}{prefix}Else")
-            indent_level += 1
+def _text_set_error_capture(step_elem, cm, lead):
+    set_elem = cm.get('Set')
+    if set_elem is not None and set_elem.get('state') == 'True':
+        return lead + 'Set Error Capture [ On ]'
+    return lead + 'Set Error Capture [ Off ]'
 
-        # --- End If ---
-        elif step_id == '70' and step_name == 'End If':
-            lines.append(f"{pad}{prefix}End If")
 
-        # --- Loop ---
-        elif step_id == '71' and step_name == 'Loop':
-            lines.append(f"{pad}{prefix}Loop")
-            indent_level += 1
+def _text_allow_user_abort(step_elem, cm, lead):
+    set_elem = cm.get('Set')
+    if set_elem is not None and set_elem.get('state') == 'True':
+        return lead + 'Allow User Abort [ On ]'
+    return lead + 'Allow User Abort [ Off ]'
 
-        # --- Exit Loop If ---
-        elif step_id == '72':
-            calc = _get_calc_direct(step_elem) or '?'
-            lines.append(f"{pad}{prefix}Exit Loop If [ {calc} ]")
-
-        # --- End Loop ---
-        elif step_id == '73':
-            lines.append(f"{pad}{prefix}End Loop")
-
-        # --- Show Custom Dialog ---
-        elif step_id == '87':
-            title = _get_calc(step_elem, 'Title') or '""'
-            message = _get_calc(step_elem, 'Message') or '""'
-            buttons_elem = step_elem.find('Buttons')
-            btn_list = []
-            if buttons_elem is not None:
-                for btn in buttons_elem.findall('Button'):
-                    calc_elem = btn.find('Calculation')
-                    if calc_elem is not None and calc_elem.text:
-                        btn_list.append(calc_elem.text.strip())
-            btn_str = ' ; '.join(btn_list) if btn_list else '"OK"'
-            parts = [title, message]
-            if btn_list:
-                parts.extend(btn_list)
-            lines.append(f"{pad}{prefix}Show Custom Dialog [ {' ; '.join(parts)} ]")
-
-        # --- Exit Script ---
-        elif step_id == '103':
-            calc = _get_calc_direct(step_elem) or ''
-            if calc:
-                lines.append(f"{pad}{prefix}Exit Script [ {calc} ]")
-            else:
-                lines.append(f"{pad}{prefix}Exit Script")
 
-        # --- Commit Records ---
-        elif step_id == '75':
-            no_interact = step_elem.find('NoInteract')
-            if no_interact is not None and no_interact.get('state') == 'True':
-                lines.append(f"{pad}{prefix}Commit Records [ No dialog ]")
-            else:
-                lines.append(f"{pad}{prefix}Commit Records")
-
-        # --- Perform Script ---
-        elif step_id == '1':
-            # Script name: prefer <Script name=>, fall back to <Text>
-            script_elem = step_elem.find('Script')
-            if script_elem is not None:
-                name = script_elem.get('name', '') or _get_text(step_elem, 'Text') or '?'
-            else:
-                name = _get_text(step_elem, 'Text') or '?'
-            # Parameter is direct <Calculation> child
-            param = _get_calc_direct(step_elem) or ''
-            if param:
-                lines.append(f'{pad}{prefix}Perform Script [ "{name}" ; {param} ]')
-            else:
-                lines.append(f'{pad}{prefix}Perform Script [ "{name}" ]')
-
-        # --- Go to Layout ---
-        elif step_id == '6':
-            layout_elem = step_elem.find('Layout')
-            dest_elem = step_elem.find('LayoutDestination')
-            name = layout_elem.get('name', '') if layout_elem is not None else ''
-            dest = dest_elem.get('value', '') if dest_elem is not None else ''
-            if dest == 'OriginalLayout':
-                lines.append(f'{pad}{prefix}Go to Layout [ original layout ]')
-            elif name:
-                lines.append(f'{pad}{prefix}Go to Layout [ "{name}" ]')
-            else:
-                lines.append(f'{pad}{prefix}Go to Layout [ current layout ]')
-
-        # --- Insert from URL ---
-        elif step_id == '160':
-            target = _get_calc(step_elem, 'Field') or ''
-            url = _get_calc(step_elem, 'URL') or ''
-            curl = _get_calc(step_elem, 'CURLOptions') or ''
-            parts = []
-            if target:
-                parts.append(f'Target: {target}')
-            if url:
-                parts.append(f'URL: {url}')
-            if curl:
-                parts.append(f'cURL: {curl}')
-            if parts:
-                lines.append(f"{pad}{prefix}Insert from URL [ {' ; '.join(parts)} ]")
-            else:
-                lines.append(f"{pad}{prefix}Insert from URL")
+def _text_set_variable(step_elem, cm, lead):
+    name = (cm.get('Name', _NO_CHILD).text or '').strip() or '$?'
+    value = (cm.get('Value', _NO_CHILD).findtext('Calculation') or '').strip()
+    return f"{lead}Set Variable [ {name} ; Value: {value} ]"
 
-        # --- Go to Record ---
-        elif step_id == '16':
-            dir_elem = step_elem.find('RowPageLocation')
-            if dir_elem is not None:
-                direction = dir_elem.get('value', '?')
-            else:
-                direction = '?'
-            lines.append(f"{pad}{prefix}Go to Record/Request/Page [ {direction} ]")
-
-        # --- New Record ---
-        elif step_id == '7' and step_name == 'New Record/Request':
-            lines.append(f"{pad}{prefix}New Record/Request")
-
-        # --- Enter Find Mode ---
-        elif step_id == '22':
-            lines.append(f"{pad}{prefix}Enter Find Mode")
-
-        # --- Perform Find ---
-        elif step_id == '28':
-            lines.append(f"{pad}{prefix}Perform Find")
-
-        # --- Sort Records ---
-        elif step_id == '39':
-            lines.append(f"{pad}{prefix}Sort Records")
-
-        # --- Set Field (76) ---
-        elif step_id == '76':
-            field_elem = step_elem.find('Field')
-            table = field_elem.get('table', '') if field_elem is not None else ''
-            fname = field_elem.get('name', '') if field_elem is not None else '?'
-            calc = _get_calc_direct(step_elem) or ''
-            field_ref = f'{table}::{fname}' if table else fname
-            if calc:
-                lines.append(f'{pad}{prefix}Set Field [ {field_ref} ; {calc} ]')
-            else:
-                lines.append(f'{pad}{prefix}Set Field [ {field_ref} ]')
-
-        # --- Insert Text (61) ---
-        elif step_id == '61':
-            field_elem = step_elem.find('Field')
-            field_target = field_elem.text.strip() if field_elem is not None and field_elem.text else ''
-            text_content = _get_text(step_elem, 'Text') or ''
-            select_all = step_elem.find('SelectAll')
-            sa = select_all.get('state', 'False') if select_all is not None else 'False'
-            preview = text_content[:80] + '...' if len(text_content) > 80 else text_content
-            preview = preview.replace('\r', ' ').replace('\n', ' ')
-            parts = []
-            if sa == 'True':
-                parts.append('Select All')
-            if field_target:
-                parts.append(f'Target: {field_target}')
-            if preview:
-                parts.append(f'"{preview}"')
-            lines.append(f'{pad}{prefix}Insert Text [ {" ; ".join(parts)} ]')
-
-        # --- New Window (122) ---
-        elif step_id == '122':
-            name_calc = _get_calc(step_elem, 'Name') or ''
-            layout_elem = step_elem.find('Layout')
-            layout_name = layout_elem.get('name', '') if layout_elem is not None else ''
-            parts = []
-            if name_calc:
-                parts.append(f'Name: {name_calc}')
-            if layout_name:
-                parts.append(f'Layout: "{layout_name}"')
-            style_elem = step_elem.find('NewWndStyles')
-            if style_elem is not None:
-                style = style_elem.get('Style', '')
-                if style:
-                    parts.append(f'Style: {style}')
-            if parts:
-                lines.append(f'{pad}{prefix}New Window [ {" ; ".join(parts)} ]')
-            else:
-                lines.append(f'{pad}{prefix}New Window')
-
-        # --- Adjust Window (31) ---
-        elif step_id == '31':
-            ws_elem = step_elem.find('WindowState')
-            state = ws_elem.get('value', '?') if ws_elem is not None else '?'
-            lines.append(f'{pad}{prefix}Adjust Window [ {state} ]')
-
-        # --- Refresh Window (80) ---
-        elif step_id == '80':
-            lines.append(f'{pad}{prefix}Refresh Window')
-
-        # --- Halt Script (90) ---
-        elif step_id == '90':
-            lines.append(f'{pad}{prefix}Halt Script')
-
-        # --- Configure LLM Template (226) ---
-        elif step_id == '226':
-            tmpl = step_elem.find('ConfigureLLMTemplate')
-            if tmpl is not None:
-                tname = _get_calc(tmpl, 'TemplateName') or ''
-                provider_elem = tmpl.find('ModelProvider')
-                provider = provider_elem.text.strip() if provider_elem is not None and provider_elem.text else ''
-                parts = []
-                if tname:
-                    parts.append(f'Template: {tname}')
-                if provider:
-                    parts.append(f'Provider: {provider}')
-                lines.append(f'{pad}{prefix}Configure LLM Template [ {" ; ".join(parts)} ]')
-            else:
-                lines.append(f'{pad}{prefix}Configure LLM Template')
-
-        # --- LLM Request (214) ---
-        elif step_id == '214':
-            req = step_elem.find('LLMRequest')
-            if req is not None:
-                model = _get_calc(req, 'Model') or ''
-                action_elem = req.find('Action')
-                action = action_elem.text.strip() if action_elem is not None and action_elem.text else ''
-                account = _get_calc(req, 'AccountName') or ''
-                prompt = _get_calc(req, 'PromptMessage') or ''
-                scope_elem = req.find('QueryScope')
-                scope = scope_elem.text.strip() if scope_elem is not None and scope_elem.text else ''
-                # Target field
-                field_elem = step_elem.find('Field')
-                target = ''
-                if field_elem is not None:
-                    t = field_elem.get('table', '')
-                    n = field_elem.get('name', '')
-                    target = f'{t}::{n}' if t else n
-                # Stream state
-                stream_elem = step_elem.find('Stream')
-                stream = stream_elem.get('state', '') if stream_elem is not None else ''
-                # Table aliases
-                tables = []
-                aliases = req.find('TableAliases')
-                if aliases is not None:
-                    for tbl in aliases.findall('Table'):
-                        tables.append(tbl.get('name', ''))
-                parts = []
-                if action:
-                    parts.append(f'Action: {action}')
-                if model:
-                    parts.append(f'Model: {model}')
-                if account:
-                    parts.append(f'Account: {account}')
-                if prompt:
-                    parts.append(f'Prompt: {prompt}')
-                if target:
-                    parts.append(f'Target: {target}')
-                if stream == 'True':
-                    parts.append('Stream: On')
-                if scope:
-                    parts.append(f'Scope: {scope}')
-                if tables:
-                    parts.append(f'Tables: {", ".join(tables)}')
-                lines.append(f'{pad}{prefix}LLM Request [ {" ; ".join(parts)} ]')
-            else:
-                lines.append(f'{pad}{prefix}LLM Request')
 
-        # --- Fallback ---
-        else:
-            lines.append(f"{pad}{prefix}{step_name} [id={step_id}]")
+def _text_set_field_by_name(step_elem, cm, lead):
+    target = (cm.get('TargetName', _NO_CHILD).findtext('Calculation') or '').strip() or '?'
+    value = (cm.get('Result', _NO_CHILD).findtext('Calculation') or '').strip()
+    return f"{lead}Set Field By Name [ {target} ; {value} ]"
+
+
+def _text_if(step_elem, cm, lead):
+    calc = (cm.get('Calculation', _NO_CHILD).text or '').strip() or '?'
+    return f"{lead}If [ {calc} ]"
+
+
+def _text_else_if(step_elem, cm, lead):
+    calc = (cm.get('Calculation', _NO_CHILD).text or '').strip() or '?'
+    return f"{lead}Else If [ {calc} ]"
+
+
+def _text_else(step_elem, cm, lead):
+    return f"{lead}Else"
+
+
+def _text_loop(step_elem, cm, lead):
+    return f"{lead}Loop"
+
+
+def _text_exit_loop_if(step_elem, cm, lead):
+    calc = (cm.get('Calculation', _NO_CHILD).text or '').strip() or '?'
+    return f"{lead}Exit Loop If [ {calc} ]"
+
+
+def _text_show_custom_dialog(step_elem, cm, lead):
+    title = (cm.get('Title', _NO_CHILD).findtext('Calculation') or '').strip() or '""'
+    message = (cm.get('Message', _NO_CHILD).findtext('Calculation') or '').strip() or '""'
+    buttons_elem = cm.get('Buttons')
+    parts = [title, message]
+    if buttons_elem is not None:
+        for btn in buttons_elem.findall('Button'):
+            # Text of the first <Calculation>; None when there is none
+            btn_text = btn.findtext('Calculation')
+            if btn_text:
+                parts.append(btn_text.strip())
+    return f"{lead}Show Custom Dialog [ {' ; '.join(parts)} ]"
+
+
+def _text_exit_script(step_elem, cm, lead):
+    calc = (cm.get('Calculation', _NO_CHILD).text or '').strip()
+    if calc:
+        return f"{lead}Exit Script [ {calc} ]"
+    return f"{lead}Exit Script"
+
+
+def _text_commit_records(step_elem, cm, lead):
+    no_interact = cm.get('NoInteract')
+    if no_interact is not None and no_interact.get('state') == 'True':
+        return f"{lead}Commit Records [ No dialog ]"
+    return f"{lead}Commit Records"
+
+
+def _text_perform_script(step_elem, cm, lead):
+    # Script name: prefer <Script name=>, fall back to <Text>
+    script_elem = cm.get('Script')
+    if script_elem is not None:
+        name = script_elem.get('name', '') or (cm.get('Text', _NO_CHILD).text or '').strip() or '?'
+    else:
+        name = (cm.get('Text', _NO_CHILD).text or '').strip() or '?'
+    # Parameter is direct <Calculation> child
+    param = (cm.get('Calculation', _NO_CHILD).text or '').strip()
+    if param:
+        return f'{lead}Perform Script [ "{name}" ; {param} ]'
+    return f'{lead}Perform Script [ "{name}" ]'
+
+
+def _text_go_to_layout(step_elem, cm, lead):
+    layout_elem = cm.get('Layout')
+    dest_elem = cm.get('LayoutDestination')
+    name = layout_elem.get('name', '') if layout_elem is not None else ''
+    dest = dest_elem.get('value', '') if dest_elem is not None else ''
+    if dest == 'OriginalLayout':
+        return f'{lead}Go to Layout [ original layout ]'
+    if name:
+        return f'{lead}Go to Layout [ "{name}" ]'
+    return f'{lead}Go to Layout [ current layout ]'
+
+
+def _text_insert_from_url(step_elem, cm, lead):
+    target = (cm.get('Field', _NO_CHILD).findtext('Calculation') or '').strip()
+    url = (cm.get('URL', _NO_CHILD).findtext('Calculation') or '').strip()
+    curl = (cm.get('CURLOptions', _NO_CHILD).findtext('Calculation') or '').strip()
+    parts = []
+    if target:
+        parts.append(f'Target: {target}')
+    if url:
+        parts.append(f'URL: {url}')
+    if curl:
+        parts.append(f'cURL: {curl}')
+    if parts:
+        return f"{lead}Insert from URL [ {' ; '.join(parts)} ]"
+    return f"{lead}Insert from URL"
+
+
+def _text_go_to_record(step_elem, cm, lead):
+    dir_elem = cm.get('RowPageLocation')
+    direction = dir_elem.get('value', '?') if dir_elem is not None else '?'
+    return f"{lead}Go to Record/Request/Page [ {direction} ]"
+
+
+def _text_set_field(step_elem, cm, lead):
+    field_elem = cm.get('Field')
+    if field_elem is None:
+        field_ref = '?'
+    else:
+        table = field_elem.get('table', '')
+        fname = field_elem.get('name', '')
+        field_ref = f'{table}::{fname}' if table else fname
+    calc = (cm.get('Calculation', _NO_CHILD).text or '').strip()
+    if calc:
+        return f'{lead}Set Field [ {field_ref} ; {calc} ]'
+    return f'{lead}Set Field [ {field_ref} ]'
+
+
+def _text_insert_text(step_elem, cm, lead):
+    field_elem = cm.get('Field')
+    field_target = field_elem.text.strip() if field_elem is not None and field_elem.text else ''
+    text_content = (cm.get('Text', _NO_CHILD).text or '').strip()
+    select_all = cm.get('SelectAll')
+    sa = select_all.get('state', 'False') if select_all is not None else 'False'
+    preview = text_content[:80] + '...' if len(text_content) > 80 else text_content
+    preview = preview.replace('\r', ' ').replace('\n', ' ')
+    parts = []
+    if sa == 'True':
+        parts.append('Select All')
+    if field_target:
+        parts.append(f'Target: {field_target}')
+    if preview:
+        parts.append(f'"{preview}"')
+    return f'{lead}Insert Text [ {" ; ".join(parts)} ]'
+
+
+def _text_new_window(step_elem, cm, lead):
+    name_calc = (cm.get('Name', _NO_CHILD).findtext('Calculation') or '').strip()
+    layout_elem = cm.get('Layout')
+    layout_name = layout_elem.get('name', '') if layout_elem is not None else ''
+    parts = []
+    if name_calc:
+        parts.append(f'Name: {name_calc}')
+    if layout_name:
+        parts.append(f'Layout: "{layout_name}"')
+    style_elem = cm.get('NewWndStyles')
+    if style_elem is not None:
+        style = style_elem.get('Style', '')
+        if style:
+            parts.append(f'Style: {style}')
+    if parts:
+        return f'{lead}New Window [ {" ; ".join(parts)} ]'
+    return f'{lead}New Window'
+
+
+def _text_adjust_window(step_elem, cm, lead):
+    ws_elem = cm.get('WindowState')
+    state = ws_elem.get('value', '?') if ws_elem is not None else '?'
+    return f'{lead}Adjust Window [ {state} ]'
+
+
+def _text_configure_llm_template(step_elem, cm, lead):
+    tmpl = cm.get('ConfigureLLMTemplate')
+    if tmpl is None:
+        return f'{lead}Configure LLM Template'
+    tm = {c.tag: c for c in reversed(tmpl)}
+    tname = (tm.get('TemplateName', _NO_CHILD).findtext('Calculation') or '').strip()
+    provider_elem = tm.get('ModelProvider')
+    provider = provider_elem.text.strip() if provider_elem is not None and provider_elem.text else ''
+    parts = []
+    if tname:
+        parts.append(f'Template: {tname}')
+    if provider:
+        parts.append(f'Provider: {provider}')
+    return f'{lead}Configure LLM Template [ {" ; ".join(parts)} ]'
+
+
+def _text_llm_request(step_elem, cm, lead):
+    req = cm.get('LLMRequest')
+    if req is None:
+        return f'{lead}LLM Request'
+    # One pass over the request's children instead of a find() per field
+    rm = {c.tag: c for c in reversed(req)}
+    model = (rm.get('Model', _NO_CHILD).findtext('Calculation') or '').strip()
+    action_elem = rm.get('Action')
+    action = action_elem.text.strip() if action_elem is not None and action_elem.text else ''
+    account = (rm.get('AccountName', _NO_CHILD).findtext('Calculation') or '').strip()
+    prompt = (rm.get('PromptMessage', _NO_CHILD).findtext('Calculation') or '').strip()
+    scope_elem = rm.get('QueryScope')
+    scope = scope_elem.text.strip() if scope_elem is not None and scope_elem.text else ''
+    # Target field
+    field_elem = cm.get('Field')
+    target = ''
+    if field_elem is not None:
+        t = field_elem.get('table', '')
+        n = field_elem.get('name', '')
+        target = f'{t}::{n}' if t else n
+    # Stream state
+    stream_elem = cm.get('Stream')
+    stream = stream_elem.get('state', '') if stream_elem is not None else ''
+    # Table aliases
+    aliases = rm.get('TableAliases')
+    tables = [tbl.get('name', '') for tbl in aliases.findall('Table')] if aliases is not None else []
+    parts = []
+    if action:
+        parts.append(f'Action: {action}')
+    if model:
+        parts.append(f'Model: {model}')
+    if account:
+        parts.append(f'Account: {account}')
+    if prompt:
+        parts.append(f'Prompt: {prompt}')
+    if target:
+        parts.append(f'Target: {target}')
+    if stream == 'True':
+        parts.append('Stream: On')
+    if scope:
+        parts.append(f'Scope: {scope}')
+    if tables:
+        parts.append(f'Tables: {", ".join(tables)}')
+    return f'{lead}LLM Request [ {" ; ".join(parts)} ]'
+
+
+def _text_fallback(step_elem, cm, lead):
+    return f"{lead}{step_elem.get('name', '')} [id={step_elem.get('id', '')}]"
+
+
+# Step id → renderer, built once at import. Steps whose text never varies
+# map straight to that text, which the loop emits without building a
+# child map or making a call.
+_TEXT_RENDERERS = {
+    '89':  _text_comment,
+    '86':  _text_set_error_capture,
+    '85':  _text_allow_user_abort,
+    '141': _text_set_variable,
+    '147': _text_set_field_by_name,
+    '68':  _text_if,
+    '69':  _text_else,
+    '72':  _text_exit_loop_if,
+    '73':  'End Loop',
+    '87':  _text_show_custom_dialog,
+    '103': _text_exit_script,
+    '75':  _text_commit_records,
+    '1':   _text_perform_script,
+    '6':   _text_go_to_layout,
+    '160': _text_insert_from_url,
+    '16':  _text_go_to_record,
+    '22':  'Enter Find Mode',
+    '28':  'Perform Find',
+    '39':  'Sort Records',
+    '76':  _text_set_field,
+    '61':  _text_insert_text,
+    '122': _text_new_window,
+    '31':  _text_adjust_window,
+    '80':  'Refresh Window',
+    '90':  'Halt Script',
+    '226': _text_configure_llm_template,
+    '214': _text_llm_request,
+}
+
+# Ids that are only recognised under their canonical step name; any other
+# name falls back to the generic "Name [id=N]" line
+_NAMED_TEXT_RENDERERS = {
+    ('125', 'Else If'):            _text_else_if,
+    ('70', 'End If'):              'End If',
+    ('71', 'Loop'):                _text_loop,
+    ('7', 'New Record/Request'):   'New Record/Request',
+}
+
+# Renderers whose step opens a block, indenting the steps that follow
+_BLOCK_OPENERS = frozenset({_text_if, _text_else_if, _text_else, _text_loop})
+
+# End If, End Loop, Else, Else If: dedent before rendering
+_DEDENT_IDS = frozenset({'70', '73', '69', '125'})
+
+# Indent strings by nesting depth, grown on demand
+_PAD_CACHE = ['']
+
+
+def _pad(n):
+    """Return the indent string for nesting depth n."""
+    while len(_PAD_CACHE) <= n:
+        _PAD_CACHE.append(_PAD_CACHE[-1] + '    ')
+    return _PAD_CACHE[n]
+
+
+def _decompile_steps(step_elems):
+    """Render a stream of <Step> elements as indented plain-text lines."""
+    lines = []
+    append = lines.append
+    get_renderer = _TEXT_RENDERERS.get
+    block_openers = _BLOCK_OPENERS
+    dedent_ids = _DEDENT_IDS
+    indent_level = 0
+    pad = ''
+
+    for step_elem in step_elems:
+        step_id = step_elem.get('id', '')
+        enable = step_elem.get('enable', 'True')
+
+        prefix = "" if enable == "True" else "// "
+
+        # Decrease indent before End and Else; pad only changes with the level
+        if step_id in dedent_ids:
+            indent_level = max(0, indent_level - 1)
+            pad = _pad(indent_level)
+
+        render = get_renderer(step_id)
+        if render is None:
+            render = _NAMED_TEXT_RENDERERS.get((step_id, step_elem.get('name', '')), _text_fallback)
+        if render.__class__ is str:
+            append(pad + prefix + render)
+            continue
+        # First child per tag, matching what step_elem.find(tag) returns
+        cm = {c.tag: c for c in reversed(step_elem)}
+        append(render(step_elem, cm, pad + prefix))
+        if render in block_openers:
+            indent_level += 1
+            pad = _pad(indent_level)
 
     return '\n'.join(lines)
 
 
-def _get_text(elem, tag):
-    """Get direct text content of a child element."""
-    child = elem.find(tag)
-    if child is not None:
-        return (child.text or '').strip()
-    return None
+# Decompiled clipboard snippets, keyed by content hash; re-running fm-cp -c
+# on an unchanged clipboard reads the text back instead of re-parsing.
+# Scripts can carry credentials, so the cache is private to the user
+# (0700 dir, 0600 files) and can be turned off with FM_CP_NO_CACHE=1 or
+# --no-cache.
+_DECOMPILE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'fm-cp')
+_DECOMPILE_CACHE_SIZE = 32
 
 
-def _get_calc(elem, parent_tag):
-    """Get calculation text from parent/Calculation structure."""
-    parent = elem.find(parent_tag)
-    if parent is not None:
-        calc = parent.find('Calculation')
-        if calc is not None:
-            return (calc.text or '').strip()
-    return None
+def _decompile_cached(xml_text):
+    """decompile_xml() memoized on disk. Cache I/O failures are ignored."""
+    raw = xml_text if isinstance(xml_text, bytes) else xml_text.encode('utf-8')
+    h = hashlib.blake2b(raw, digest_size=16)
+    # Output depends on the decompiler, so a new release or an edited
+    # source checkout (same version, newer module) starts fresh
+    try:
+        stamp = os.stat(__file__).st_mtime_ns
+    except OSError:
+        stamp = 0
+    h.update(f'{__version__}:{stamp}'.encode())
+    path = os.path.join(_DECOMPILE_CACHE_DIR, h.hexdigest() + '.txt')
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            plain_text = f.read()
+        os.utime(path)
+        return plain_text
+    except (OSError, UnicodeDecodeError):
+        pass
 
+    plain_text = decompile_xml(xml_text)
+    try:
+        os.makedirs(_DECOMPILE_CACHE_DIR, mode=0o700, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                f.write(plain_text)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+        _prune_decompile_cache()
+    except OSError:
+        pass
+    return plain_text
 
-def _get_calc_direct(elem):
-    """Get calculation text directly under the element."""
-    calc = elem.find('Calculation')
-    if calc is not None:
-        return (calc.text or '').strip()
-    return None
+
+def _prune_decompile_cache():
+    """Drop all but the most recently used cache entries."""
+    entries = [e for e in os.scandir(_DECOMPILE_CACHE_DIR) if e.name.endswith('.txt')]
+    if len(entries) <= _DECOMPILE_CACHE_SIZE:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for e in entries[_DECOMPILE_CACHE_SIZE:]:
+        os.remove(e.path)
 
 
 # ============================================================
 #  CLIPBOARD SUPPORT (macOS)
 # ============================================================
 
+# General pasteboard and the AppKit names used with it, probed once per
+# process: _PB_OK is None until the PyObjC import has been tried, then
+# True/False. AppKit stays a lazy import; loading it costs more than a
+# compose run that never touches the clipboard.
+_PB = None
+_PB_OK = None
+_NSData = None
+_NSPasteboardTypeString = None
+
+
+def _pasteboard():
+    """Return the cached NSPasteboard, or None when PyObjC is unavailable."""
+    global _PB, _PB_OK, _NSData, _NSPasteboardTypeString
+    if _PB_OK is None:
+        try:
+            from AppKit import NSPasteboard, NSData, NSPasteboardTypeString
+        except ImportError:
+            _PB_OK = False
+        else:
+            _PB = NSPasteboard.generalPasteboard()
+            _NSData = NSData
+            _NSPasteboardTypeString = NSPasteboardTypeString
+            _PB_OK = True
+    return _PB
+
+
 def load_to_clipboard(xml_text, paste_type='XMSS'):
     """Load XML onto macOS clipboard as FileMaker pasteboard object.
     Tries PyObjC directly, then falls back to system Python subprocess."""
-    import subprocess
-
     type_map = {
         'XMSS': 0x584D5353, 'XMSC': 0x584D5343,
         'XMFN': 0x584D464E, 'XMTB': 0x584D5442,
@@ -1116,22 +1350,17 @@ def load_to_clipboard(xml_text, paste_type='XMSS'):
     }
 
     # --- Attempt 1: PyObjC in current environment ---
-    try:
-        from AppKit import NSPasteboard, NSData
-
+    pb = _pasteboard()
+    if pb is not None:
         hex_code = type_map.get(paste_type, 0x584D5353)
         flavor = f"CorePasteboardFlavorType 0x{hex_code:08X}"
 
-        pb = NSPasteboard.generalPasteboard()
         pb.clearContents()
         xml_bytes = xml_text.encode('utf-8')
-        ns_data = NSData.dataWithBytes_length_(xml_bytes, len(xml_bytes))
+        ns_data = _NSData.dataWithBytes_length_(xml_bytes, len(xml_bytes))
         pb.setData_forType_(ns_data, flavor)
         return True
 
-    except ImportError:
-        pass
-
     # --- Attempt 2: Inline system Python subprocess ---
     # Minimal PyObjC clipboard write as a one-liner via /usr/bin/python3
     try:
@@ -1165,36 +1394,53 @@ def load_to_clipboard(xml_text, paste_type='XMSS'):
 
 def read_clipboard_text():
     """Read plain text from macOS clipboard."""
-    try:
-        from AppKit import NSPasteboard, NSPasteboardTypeString
-        pb = NSPasteboard.generalPasteboard()
-        text = pb.stringForType_(NSPasteboardTypeString)
-        return text
-    except ImportError:
-        # Fallback to pbpaste
-        import subprocess
-        result = subprocess.run(['pbpaste'], capture_output=True, text=True)
-        return result.stdout
+    pb = _pasteboard()
+    if pb is not None:
+        return pb.stringForType_(_NSPasteboardTypeString)
+    # Fallback to pbpaste
+    result = subprocess.run(['pbpaste'], capture_output=True, text=True)
+    return result.stdout
+
+
+def write_clipboard_text(text):
+    """Put plain text on the macOS clipboard."""
+    pb = _pasteboard()
+    if pb is not None:
+        pb.clearContents()
+        pb.setString_forType_(text, _NSPasteboardTypeString)
+        return
+    # Fallback to pbcopy
+    subprocess.run(['pbcopy'], input=text.encode('utf-8'))
 
 
 def read_clipboard_fm():
-    """Read FM XML from macOS clipboard (XMSS type)."""
-    try:
-        from AppKit import NSPasteboard, NSData
-        pb = NSPasteboard.generalPasteboard()
-
-        # Try XMSS first, then XMSC
-        for hex_code in [0x584D5353, 0x584D5343]:
-            flavor = f"CorePasteboardFlavorType 0x{hex_code:08X}"
-            data = pb.dataForType_(flavor)
-            if data:
-                return bytes(data).decode('utf-8'), 'XMSS' if hex_code == 0x584D5353 else 'XMSC'
-
-        return None, None
-    except ImportError:
+    """Read raw FM XML bytes from macOS clipboard (XMSS type)."""
+    pb = _pasteboard()
+    if pb is None:
         print("  ERROR: PyObjC not available.")
         return None, None
 
+    # Try XMSS first, then XMSC
+    for hex_code in [0x584D5353, 0x584D5343]:
+        flavor = f"CorePasteboardFlavorType 0x{hex_code:08X}"
+        data = pb.dataForType_(flavor)
+        if data:
+            # Raw bytes, copied once from the NSData buffer; the parser
+            # decodes them per the XML declaration
+            return bytes(data), 'XMSS' if hex_code == 0x584D5353 else 'XMSC'
+
+    return None, None
+
+
+def read_clipboard_any():
+    """Read FM XML (as bytes) from the clipboard, or plain text when there
+    is none. Returns (content, source label). All reads reuse the cached
+    pasteboard; without PyObjC the text comes from pbpaste."""
+    xml_bytes, fm_type = read_clipboard_fm()
+    if xml_bytes:
+        return xml_bytes, f"clipboard ({fm_type})"
+    return read_clipboard_text(), "clipboard"
+
 
 # ============================================================
 #  CLI
@@ -1208,16 +1454,27 @@ def print_banner(mode):
 
 
 def _is_fm_xml(text):
-    """Detect if text is FM XML content."""
-    t = text.strip()
-    return t.startswith('<fmxmlsnippet') or t.startswith('<?xml')
+    """Detect if text (str or bytes) is FM XML content."""
+    if isinstance(text, bytes):
+        prefixes = (b'<fmxmlsnippet', b'<?xml')
+    else:
+        prefixes = ('<fmxmlsnippet', '<?xml')
+    # Skip leading whitespace in place rather than strip()ing a copy of
+    # what may be a megabyte-scale clipboard
+    i = 0
+    n = len(text)
+    while i < n and text[i:i + 1].isspace():
+        i += 1
+    return text.startswith(prefixes, i)
 
 
 def cmd_process(args):
     """Unified processor: auto-detect input, route accordingly."""
     clipboard_mode = '-c' in args or '--clipboard' in args
+    use_cache = '--no-cache' not in args and not os.environ.get('FM_CP_NO_CACHE')
     output_file = None
     file_path = None
+    xml_path = None
 
     # Parse -o/--output with its value
     skip_next = False
@@ -1228,19 +1485,12 @@ def cmd_process(args):
         if a in ('-o', '--output') and i + 1 < len(args):
             output_file = args[i + 1]
             skip_next = True
-        elif a not in ('-c', '--clipboard'):
+        elif a not in ('-c', '--clipboard', '--no-cache'):
             file_path = a
 
     # --- Get input ---
     if clipboard_mode:
-        # Try FM pasteboard first
-        xml_text, fm_type = read_clipboard_fm()
-        if xml_text:
-            content = xml_text
-            source = f"clipboard ({fm_type})"
-        else:
-            content = read_clipboard_text()
-            source = "clipboard"
+        content, source = read_clipboard_any()
         if not content:
             print_banner("clipboard")
             print("  ✗ ERROR: No content found on clipboard")
@@ -1248,41 +1498,49 @@ def cmd_process(args):
             sys.exit(1)
     elif file_path:
         with open(file_path, 'r') as f:
-            content = f.read()
+            content = f.read(_FEED_CHUNK)
+            if _is_fm_xml(content):
+                # XML files are streamed into the decompiler; only the
+                # head is needed here to pick the route
+                xml_path = file_path
+            else:
+                content += f.read()
         source = file_path
     else:
         # No args — try clipboard as default
-        xml_text, fm_type = read_clipboard_fm()
-        if xml_text:
-            content = xml_text
-            source = f"clipboard ({fm_type})"
+        content, source = read_clipboard_any()
+        if content:
             clipboard_mode = True
         else:
-            content = read_clipboard_text()
-            if content:
-                source = "clipboard"
-                clipboard_mode = True
-            else:
-                print_banner("fm_cp")
-                print("  Usage: fm-cp [-c] [-o file] [input]")
-                print()
-                print("  Auto-detects input format:")
-                print("    Plain text → compose → FM XML to clipboard")
-                print("    FM XML     → decompile → plain text to clipboard")
-                print()
-                print("  Options:")
-                print("    -c          Read from clipboard")
-                print("    -o file     Write output to file instead of clipboard")
-                print("=" * 60)
-                sys.exit(0)
+            print_banner("fm_cp")
+            print("  Usage: fm-cp [-c] [--no-cache] [-o file] [input]")
+            print()
+            print("  Auto-detects input format:")
+            print("    Plain text → compose → FM XML to clipboard")
+            print("    FM XML     → decompile → plain text to clipboard")
+            print()
+            print("  Options:")
+            print("    -c          Read from clipboard")
+            print("    --no-cache  Don't cache decompiled clipboard text on disk")
+            print("    -o file     Write output to file instead of clipboard")
+            print("=" * 60)
+            sys.exit(0)
 
     is_xml = _is_fm_xml(content)
+    if not is_xml and isinstance(content, bytes):
+        # FM pasteboard data that isn't XML goes to the composer as text
+        content = content.decode('utf-8')
 
     # --- Route ---
     if is_xml:
         # XML → decompile to readable plain text
         print_banner(f"decompile — {source}")
-        plain_text = decompile_xml(content)
+        if xml_path:
+            plain_text = decompile_stream(xml_path)
+        elif use_cache:
+            plain_text = _decompile_cached(content)
+        else:
+            plain_text = decompile_xml(content)
         print()
         print(plain_text)
         print()
@@ -1296,8 +1554,7 @@ def cmd_process(args):
         else:
             # Copy plain text to clipboard for pasting to Claude
             try:
-                import subprocess
-                subprocess.run(['pbcopy'], input=plain_text.encode('utf-8'))
+                write_clipboard_text(plain_text)
                 print("  (Plain text copied to clipboard — paste to Claude)")
             except Exception:
                 pass
@@ -1369,15 +1626,15 @@ def cmd_dump(args=None):
                 output_file = args[i + 1]
 
     print_banner("dump — raw clipboard XML")
-    xml_text, fm_type = read_clipboard_fm()
-    if xml_text:
+    xml_bytes, fm_type = read_clipboard_fm()
+    if xml_bytes:
         print(f"  Type: {fm_type}")
-        print(f"  Size: {len(xml_text)} bytes")
+        print(f"  Size: {len(xml_bytes)} bytes")
         print()
-        print(xml_text)
+        print(xml_bytes.decode('utf-8', errors='replace'))
         if output_file:
-            with open(output_file, 'w') as f:
-                f.write(xml_text)
+            with open(output_file, 'wb') as f:
+                f.write(xml_bytes)
             print()
             print(f"  → Saved to {output_file}")
     else:
@@ -1395,7 +1652,7 @@ def main():
 
     if not args or args[0] in ('-h', '--help'):
         print_banner("fm_cp")
-        print("  Usage: fm-cp [-c] [-o file] [input]")
+        print("  Usage: fm-cp [-c] [--no-cache] [-o file] [input]")
         print()
         print("  Auto-detects input format:")
         print("    Plain text on clipboard → compose → FM XML to clipboard (Cmd+V into FM)")
@@ -1403,6 +1660,7 @@ def main():
         print()
         print("  Options:")
         print("    -c          Read from clipboard")
+        print("    --no-cache  Don't cache decompiled clipboard text on disk")
         print("    -o file     Write output to file instead of clipboard")
         print()
         print("  Examples:")